@@ -3,38 +3,47 @@ import json
 import re
 from pathlib import Path
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import repeat
+from operator import itemgetter
+
+# Text-only extraction: image blocks are never used, so don't let MuPDF build them,
+# and expand ligatures so each glyph maps to the characters it stands for.
+TEXT_FLAGS = fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES & ~fitz.TEXT_PRESERVE_LIGATURES
 
 
 def extract_characters(doc, threshold_factor=0.15):
     chars = []
     for page_num, page in enumerate(doc, start=1):
-        for block in page.get_text("dict")["blocks"]:
+        for block in page.get_text("dict", flags=TEXT_FLAGS)["blocks"]:
             if "lines" not in block:
                 continue
             for line in block["lines"]:
                 for span in line["spans"]:
+                    x0, y0, x1, y1 = span["bbox"]
+                    span_width = x1 - x0
+                    if span_width <= 0:
+                        continue
                     text = span["text"].strip()
                     if not text:
                         continue
-                    x0, y0, x1, y1 = span["bbox"]
                     font_size = span.get("size", 0)
                     bold = bool(span.get("flags", 0) & 2)
 
-                    span_width = x1 - x0
                     span_height = y1 - y0
                     char_count = len(text)
-                    if char_count == 0 or span_width <= 0:
-                        continue
 
                     base_width = span_width / char_count
                     x_pad = base_width * threshold_factor
                     y_pad = span_height * threshold_factor
+                    # Vertical extent is shared by every character in the span.
+                    cy0 = round(y0 - y_pad, 2)
+                    cy1 = round(y1 + y_pad, 2)
 
                     for i, c in enumerate(text):
                         cx0 = x0 + i * base_width - x_pad
                         cx1 = x0 + (i + 1) * base_width + x_pad
-                        cy0 = y0 - y_pad
-                        cy1 = y1 + y_pad
 
                         char_box = {
                             "char": c,
@@ -43,8 +52,8 @@ def extract_characters(doc, threshold_factor=0.15):
                             "page": page_num,
                             "x0": round(cx0, 2),
                             "x1": round(cx1, 2),
-                            "y0": round(cy0, 2),
-                            "y1": round(cy1, 2),
+                            "y0": cy0,
+                            "y1": cy1,
                         }
                         chars.append(char_box)
     return chars
@@ -72,17 +81,14 @@ def deduplicate_chars(chars):
     return result
 
 
+# A run of the same alphanumeric character ([^\W_] is exactly str.isalnum).
+REPEATED_ALNUM = re.compile(r'([^\W_])\1+')
+
+
 def deduplicate(text):
     if not text:
         return ""
-    chars = list(text)
-    result = []
-    prev_c = ''
-    for c in chars:
-        if c != prev_c or not c.isalnum():
-            result.append(c)
-        prev_c = c
-    return ''.join(result)
+    return REPEATED_ALNUM.sub(r'\1', text)
 
 
 def detect_title_and_filter_blocks(blocks, debug_dir=None):
@@ -90,10 +96,10 @@ def detect_title_and_filter_blocks(blocks, debug_dir=None):
         return "", []
 
     max_font = max(b['font_size'] for b in blocks)
-    max_font_blocks = [b for b in blocks if b['font_size'] == max_font]
-    max_font_blocks.sort(key=lambda b: (b['y0'], b['page']))
-
-    anchor_block = max_font_blocks[0]
+    anchor_block = min(
+        (b for b in blocks if b['font_size'] == max_font),
+        key=itemgetter('y0', 'page')
+    )
     title_page = anchor_block['page']
     anchor_y = anchor_block['y0']
 
@@ -101,7 +107,7 @@ def detect_title_and_filter_blocks(blocks, debug_dir=None):
         b for b in blocks
         if b['page'] == title_page and b['y0'] >= anchor_y and (1 * max_font <= b['font_size'] <= 2.0 * max_font)
     ]
-    title_blocks.sort(key=lambda b: b['y0'])
+    title_blocks.sort(key=itemgetter('y0'))
     title_lines = [b['text'] for b in title_blocks]
     title_text = deduplicate(' '.join(title_lines))
 
@@ -116,53 +122,56 @@ def cluster_font_sizes(blocks):
     freq = Counter(round(b['font_size']) for b in blocks)
     body = freq.most_common(1)[0][0]
     heads = sorted([s for s in freq if s > body], reverse=True)[:4]
-    return heads, body
+    levels = {s: 'H' + str(i + 1) for i, s in enumerate(heads)}
+    return levels, body
 
 
 def deduplicate_lines(blocks):
     result = []
-    seen = []
+    seen = {}
     for block in blocks:
-        duplicate_found = False
-        for existing in seen:
-            if block['page'] == existing['page'] and abs(block['y0'] - existing['y0']) < 2.0 and block['text'] == existing['text']:
-                duplicate_found = True
-                break
-        if not duplicate_found:
-            seen.append(block)
-            result.append(block)
+        # Only lines with the same page and text can be duplicates.
+        seen_y = seen.setdefault((block['page'], block['text']), [])
+        if any(abs(block['y0'] - y) < 2.0 for y in seen_y):
+            continue
+        seen_y.append(block['y0'])
+        result.append(block)
     return result
 
 
-def classify_headings(blocks, title="", lang="en"):
-    heads, body = cluster_font_sizes(blocks)
-    blocks = deduplicate_lines(blocks)
-    items = []
-
-    # Load language-specific heading regex
-    patterns = []
+@lru_cache(maxsize=None)
+def load_heading_patterns(lang="en"):
+    # Load language-specific heading regex once per process
     try:
         with open("languages.json", encoding="utf-8") as f:
             lang_data = json.load(f)
-            patterns = [re.compile(p, re.IGNORECASE) for p in lang_data.get(lang, {}).get("heading_patterns", [])]
+            return tuple(re.compile(p, re.IGNORECASE) for p in lang_data.get(lang, {}).get("heading_patterns", []))
     except Exception as e:
         print(f"Warning: Failed to load language patterns for '{lang}': {e}")
+        return ()
+
+
+def classify_headings(blocks, title="", lang="en"):
+    levels, body = cluster_font_sizes(blocks)
+    blocks = deduplicate_lines(blocks)
+    items = []
+
+    patterns = load_heading_patterns(lang)
 
     for b in blocks:
-        s = round(b['font_size'])
         t = b['text']
         if not t:
             continue
-        if sum(c.isalpha() for c in t) / max(len(t), 1) < 0.4:
+        if sum(map(str.isalpha, t)) / len(t) < 0.4:
             continue
 
+        s = round(b['font_size'])
+
         fixed_text = deduplicate(t)
-        lvl = None
 
         # Font-based heading
-        if s in heads:
-            lvl = 'H' + str(heads.index(s) + 1)
-        elif s > body and b['bold'] and abs(b['x0'] - 150) < 50:
+        lvl = levels.get(s)
+        if not lvl and s > body and b['bold'] and abs(b['x0'] - 150) < 50:
             lvl = 'H3'
 
         # Regex pattern match
@@ -175,7 +184,7 @@ def classify_headings(blocks, title="", lang="en"):
         if lvl:
             items.append((b['page'], b['y0'], b['x0'], lvl, fixed_text))
 
-    items.sort(key=lambda x: (x[0], x[1], x[2]))
+    items.sort(key=itemgetter(0, 1, 2))
 
     outline = []
     seen_h1 = False
@@ -201,11 +210,11 @@ def extract_outline(path, lang="en"):
 
     blocks = []
     for (pg, y), line_chars in temp.items():
-        line_chars.sort(key=lambda x: x['x0'])
-        text = ''.join([x['char'] for x in line_chars])
-        font_size = max(x['font_size'] for x in line_chars)
-        bold = any(x['bold'] for x in line_chars)
-        x0 = min(x['x0'] for x in line_chars)
+        line_chars.sort(key=itemgetter('x0'))
+        text = ''.join(map(itemgetter('char'), line_chars))
+        font_size = max(map(itemgetter('font_size'), line_chars))
+        bold = any(map(itemgetter('bold'), line_chars))
+        x0 = line_chars[0]['x0']
         blocks.append({
             'text': text,
             'font_size': font_size,
@@ -220,16 +229,23 @@ def extract_outline(path, lang="en"):
     return {'title': title, 'outline': outline}
 
 
+def process_pdf(pdf, outp, lang="en"):
+    result = extract_outline(pdf, lang)
+    # Serialize in one go; json.dump issues a separate write per token.
+    output = json.dumps(result, ensure_ascii=False, indent=2)
+    (outp / f'{pdf.stem}.json').write_text(output, encoding='utf-8')
+    return f"Processed {pdf.name}"
+
+
 def main(inp, outp, lang="en"):
     inp, outp = Path(inp), Path(outp)
     outp.mkdir(exist_ok=True)
-    for pdf in inp.glob('*.pdf'):
-        print(f"Processing {pdf.name}...")
-        result = extract_outline(pdf, lang)
-        with open(outp / f'{pdf.stem}.json', 'w', encoding='utf-8') as f:
-            json.dump(result, f, ensure_ascii=False, indent=2)
-        print(f"  -> Completed {pdf.name}\n")
-    print("All files processed.")
+    pdfs = [p for p in inp.iterdir() if p.suffix.lower() == '.pdf']
+    # Each PDF is independent and CPU-bound, so fan out across processes.
+    with ProcessPoolExecutor() as pool:
+        status = list(pool.map(process_pdf, pdfs, repeat(outp), repeat(lang)))
+    status.append("All files processed.")
+    print('\n'.join(status))
 
 
 if __name__ == '__main__':